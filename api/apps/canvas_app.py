@@ -14,11 +14,12 @@
 #  limitations under the License.
 #
 import json
+import logging
 from functools import partial
 from flask import request, Response
 from flask_login import login_required, current_user
 from api.db.services.canvas_service import CanvasTemplateService, UserCanvasService
-from api.settings import RetCode
+from api.settings import RetCode, stat_logger
 from api.utils import get_uuid
 from api.utils.api_utils import get_json_result, server_error_response, validate_request, get_data_error_result
 from agent.canvas import Canvas
@@ -110,7 +111,8 @@ def run():
             canvas.messages.append({"role": "user", "content": req["message"], "id": message_id})
             canvas.add_user_input(req["message"])
         answer = canvas.run(stream=stream)
-        print(canvas)
+        if stat_logger.isEnabledFor(logging.DEBUG):
+            stat_logger.debug(str(canvas))
     except Exception as e:
         return server_error_response(e)
 
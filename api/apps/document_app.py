@@ -17,10 +17,9 @@ import datetime
 import hashlib
 import json
 import os
-import pathlib
 import re
 import traceback
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from copy import deepcopy
 from io import BytesIO
 
@@ -35,27 +34,58 @@ from api.db.services.file2document_service import File2DocumentService
 from api.db.services.file_service import FileService
 from api.db.services.llm_service import LLMBundle
 from api.db.services.task_service import TaskService, queue_tasks
-from api.db.services.user_service import TenantService, UserTenantService
+from api.db.services.user_service import TenantService
 from graphrag.mind_map_extractor import MindMapExtractor
 from rag.app import naive
 from rag.nlp import search
 from rag.utils.es_conn import ELASTICSEARCH
 from api.db.services import duplicate_name
 from api.db.services.knowledgebase_service import KnowledgebaseService
-from api.utils.api_utils import server_error_response, get_data_error_result, validate_request
+from api.utils.api_utils import server_error_response, get_data_error_result, validate_request, handle_errors
 from api.utils import get_uuid
 from api.db import FileType, TaskStatus, ParserType, FileSource, LLMType
-from api.db.services.document_service import DocumentService, doc_upload_and_parse
+from api.db.services.document_service import DocumentService, doc_upload_and_queue
 from api.settings import RetCode, stat_logger
 from api.utils.api_utils import get_json_result
 from rag.utils.minio_conn import MINIO
 from api.utils.file_utils import filename_type, thumbnail, get_project_base_directory
 from api.utils.web_utils import html2pdf, is_valid_url
 
+_EXT_PRESENTATION = re.compile(r"\.(ppt|pptx|pages)$")
+_EXT_SUFFIX = re.compile(r"\.([^.]+)$")
+# Each worker holds a pooled MySQL connection, so keep per-request fan-out small.
+_MAX_WORKERS = 8
+_PARSER_CONFIG_CASTS = {"chunk_token_num": int}
+_RAPTOR_CASTS = {"max_cluster": int, "max_token": int, "random_seed": int, "threshold": float}
+
+
+def _stream_response(obj, **kwargs):
+    response = flask.Response(obj.stream(64 * 1024), **kwargs)
+    # Released on close rather than at the end of iteration: HEAD, 204 and 304
+    # responses are closed without ever being iterated.
+    response.call_on_close(obj.close)
+    response.call_on_close(obj.release_conn)
+    if obj.headers.get("Content-Length"):
+        response.headers.set("Content-Length", obj.headers["Content-Length"])
+    return response
+
+
+def _cast_parser_config(parser_config):
+    for k, f in _PARSER_CONFIG_CASTS.items():
+        if k in parser_config:
+            parser_config[k] = f(parser_config[k])
+    raptor = parser_config.get("raptor")
+    if raptor:
+        for k, f in _RAPTOR_CASTS.items():
+            if k in raptor:
+                raptor[k] = f(raptor[k])
+    return parser_config
+
 
 @manager.route('/upload', methods=['POST'])
 @login_required
 @validate_request("kb_id")
+@handle_errors
 def upload():
     kb_id = request.form.get("kb_id")
     if not kb_id:
@@ -85,6 +115,7 @@ def upload():
 @manager.route('/web_crawl', methods=['POST'])
 @login_required
 @validate_request("kb_id", "name", "url")
+@handle_errors
 def web_crawl():
     kb_id = request.form.get("kb_id")
     if not kb_id:
@@ -108,47 +139,44 @@ def web_crawl():
     kb_root_folder = FileService.get_kb_folder(current_user.id)
     kb_folder = FileService.new_a_file_from_kb(kb.tenant_id, kb.name, kb_root_folder["id"])
 
-    try:
-        filename = duplicate_name(
-            DocumentService.query,
-            name=name + ".pdf",
-            kb_id=kb.id)
-        filetype = filename_type(filename)
-        if filetype == FileType.OTHER.value:
-            raise RuntimeError("This type of file has not been supported yet!")
-
-        location = filename
-        while MINIO.obj_exist(kb_id, location):
-            location += "_"
-        MINIO.put(kb_id, location, blob)
-        doc = {
-            "id": get_uuid(),
-            "kb_id": kb.id,
-            "parser_id": kb.parser_id,
-            "parser_config": kb.parser_config,
-            "created_by": current_user.id,
-            "type": filetype,
-            "name": filename,
-            "location": location,
-            "size": len(blob),
-            "thumbnail": thumbnail(filename, blob)
-        }
-        if doc["type"] == FileType.VISUAL:
-            doc["parser_id"] = ParserType.PICTURE.value
-        if doc["type"] == FileType.AURAL:
-            doc["parser_id"] = ParserType.AUDIO.value
-        if re.search(r"\.(ppt|pptx|pages)$", filename):
-            doc["parser_id"] = ParserType.PRESENTATION.value
-        DocumentService.insert(doc)
-        FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
-    except Exception as e:
-        return server_error_response(e)
+    filename = duplicate_name(
+        DocumentService.query,
+        name=name + ".pdf",
+        kb_id=kb.id)
+    filetype = filename_type(filename)
+    if filetype == FileType.OTHER.value:
+        raise RuntimeError("This type of file has not been supported yet!")
+
+    doc_id = get_uuid()
+    location = "{}_{}".format(doc_id, filename)
+    MINIO.put(kb_id, location, blob)
+    doc = {
+        "id": doc_id,
+        "kb_id": kb.id,
+        "parser_id": kb.parser_id,
+        "parser_config": kb.parser_config,
+        "created_by": current_user.id,
+        "type": filetype,
+        "name": filename,
+        "location": location,
+        "size": len(blob),
+        "thumbnail": thumbnail(filename, blob)
+    }
+    if doc["type"] == FileType.VISUAL:
+        doc["parser_id"] = ParserType.PICTURE.value
+    if doc["type"] == FileType.AURAL:
+        doc["parser_id"] = ParserType.AUDIO.value
+    if _EXT_PRESENTATION.search(filename):
+        doc["parser_id"] = ParserType.PRESENTATION.value
+    DocumentService.insert(doc)
+    FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
     return get_json_result(data=True)
 
 
 @manager.route('/create', methods=['POST'])
 @login_required
 @validate_request("name", "kb_id")
+@handle_errors
 def create():
     req = request.json
     kb_id = req["kb_id"]
@@ -156,45 +184,38 @@ def create():
         return get_json_result(
             data=False, retmsg='Lack of "KB ID"', retcode=RetCode.ARGUMENT_ERROR)
 
-    try:
-        e, kb = KnowledgebaseService.get_by_id(kb_id)
-        if not e:
-            return get_data_error_result(
-                retmsg="Can't find this knowledgebase!")
-
-        if DocumentService.query(name=req["name"], kb_id=kb_id):
-            return get_data_error_result(
-                retmsg="Duplicated document name in the same knowledgebase.")
-
-        doc = DocumentService.insert({
-            "id": get_uuid(),
-            "kb_id": kb.id,
-            "parser_id": kb.parser_id,
-            "parser_config": kb.parser_config,
-            "created_by": current_user.id,
-            "type": FileType.VIRTUAL,
-            "name": req["name"],
-            "location": "",
-            "size": 0
-        })
-        return get_json_result(data=doc.to_json())
-    except Exception as e:
-        return server_error_response(e)
+    e, kb = KnowledgebaseService.get_by_id(kb_id)
+    if not e:
+        return get_data_error_result(
+            retmsg="Can't find this knowledgebase!")
+
+    if DocumentService.query(name=req["name"], kb_id=kb_id):
+        return get_data_error_result(
+            retmsg="Duplicated document name in the same knowledgebase.")
+
+    doc = DocumentService.insert({
+        "id": get_uuid(),
+        "kb_id": kb.id,
+        "parser_id": kb.parser_id,
+        "parser_config": kb.parser_config,
+        "created_by": current_user.id,
+        "type": FileType.VIRTUAL,
+        "name": req["name"],
+        "location": "",
+        "size": 0
+    })
+    return get_json_result(data=doc.to_json())
 
 
 @manager.route('/list', methods=['GET'])
 @login_required
+@handle_errors
 def list_docs():
     kb_id = request.args.get("kb_id")
     if not kb_id:
         return get_json_result(
             data=False, retmsg='Lack of "KB ID"', retcode=RetCode.ARGUMENT_ERROR)
-    tenants = UserTenantService.query(user_id=current_user.id)
-    for tenant in tenants:
-        if KnowledgebaseService.query(
-                tenant_id=tenant.tenant_id, id=kb_id):
-            break
-    else:
+    if not KnowledgebaseService.user_has_access(current_user.id, kb_id):
         return get_json_result(
             data=False, retmsg=f'Only owner of knowledgebase authorized for this operation.',
             retcode=RetCode.OPERATING_ERROR)
@@ -204,15 +225,13 @@ def list_docs():
     items_per_page = int(request.args.get("page_size", 15))
     orderby = request.args.get("orderby", "create_time")
     desc = request.args.get("desc", True)
-    try:
-        docs, tol = DocumentService.get_by_kb_id(
-            kb_id, page_number, items_per_page, orderby, desc, keywords)
-        return get_json_result(data={"total": tol, "docs": docs})
-    except Exception as e:
-        return server_error_response(e)
+    docs, tol = DocumentService.get_by_kb_id(
+        kb_id, page_number, items_per_page, orderby, desc, keywords)
+    return get_json_result(data={"total": tol, "docs": docs})
 
 
 @manager.route('/infos', methods=['POST'])
+@handle_errors
 def docinfos():
     req = request.json
     doc_ids = req["doc_ids"]
@@ -222,94 +241,104 @@ def docinfos():
 
 @manager.route('/thumbnails', methods=['GET'])
 #@login_required
+@handle_errors
 def thumbnails():
     doc_ids = request.args.get("doc_ids").split(",")
     if not doc_ids:
         return get_json_result(
             data=False, retmsg='Lack of "Document ID"', retcode=RetCode.ARGUMENT_ERROR)
 
-    try:
-        docs = DocumentService.get_thumbnails(doc_ids)
-        return get_json_result(data={d["id"]: d["thumbnail"] for d in docs})
-    except Exception as e:
-        return server_error_response(e)
+    docs = DocumentService.get_thumbnails(doc_ids)
+    return get_json_result(data={d["id"]: d["thumbnail"] for d in docs})
 
 
 @manager.route('/change_status', methods=['POST'])
 @login_required
 @validate_request("doc_id", "status")
+@handle_errors
 def change_status():
     req = request.json
     if str(req["status"]) not in ["0", "1"]:
-        get_json_result(
+        return get_json_result(
             data=False,
             retmsg='"Status" must be either 0 or 1!',
             retcode=RetCode.ARGUMENT_ERROR)
+    status = int(req["status"])
 
-    try:
-        e, doc = DocumentService.get_by_id(req["doc_id"])
-        if not e:
-            return get_data_error_result(retmsg="Document not found!")
-        e, kb = KnowledgebaseService.get_by_id(doc.kb_id)
-        if not e:
-            return get_data_error_result(
-                retmsg="Can't find this knowledgebase!")
-
-        if not DocumentService.update_by_id(
-                req["doc_id"], {"status": str(req["status"])}):
-            return get_data_error_result(
-                retmsg="Database error (Document update)!")
-
-        if str(req["status"]) == "0":
-            ELASTICSEARCH.updateScriptByQuery(Q("term", doc_id=req["doc_id"]),
-                                              scripts="ctx._source.available_int=0;",
-                                              idxnm=search.index_name(
-                                                  kb.tenant_id)
-                                              )
-        else:
-            ELASTICSEARCH.updateScriptByQuery(Q("term", doc_id=req["doc_id"]),
-                                              scripts="ctx._source.available_int=1;",
-                                              idxnm=search.index_name(
-                                                  kb.tenant_id)
-                                              )
-        return get_json_result(data=True)
-    except Exception as e:
-        return server_error_response(e)
+    e, doc = DocumentService.get_by_id(req["doc_id"])
+    if not e:
+        return get_data_error_result(retmsg="Document not found!")
+    e, kb = KnowledgebaseService.get_by_id(doc.kb_id)
+    if not e:
+        return get_data_error_result(
+            retmsg="Can't find this knowledgebase!")
+
+    if not DocumentService.update_by_id(
+            req["doc_id"], {"status": str(status)}):
+        return get_data_error_result(
+            retmsg="Database error (Document update)!")
+
+    ELASTICSEARCH.updateScriptByQuery(Q("term", doc_id=req["doc_id"]),
+                                      scripts="ctx._source.available_int=params.v;",
+                                      idxnm=search.index_name(kb.tenant_id),
+                                      params={"v": status})
+    return get_json_result(data=True)
 
 
 @manager.route('/rm', methods=['POST'])
 @login_required
 @validate_request("doc_id")
+@handle_errors
 def rm():
     req = request.json
     doc_ids = req["doc_id"]
     if isinstance(doc_ids, str): doc_ids = [doc_ids]
+    # Workers run concurrently, so a repeated id would be removed twice.
+    doc_ids = list(dict.fromkeys(doc_ids))
     root_folder = FileService.get_root_folder(current_user.id)
     pf_id = root_folder["id"]
     FileService.init_knowledgebase_docs(pf_id, current_user.id)
-    errors = ""
-    for doc_id in doc_ids:
-        try:
-            e, doc = DocumentService.get_by_id(doc_id)
-            if not e:
-                return get_data_error_result(retmsg="Document not found!")
-            tenant_id = DocumentService.get_tenant_id(doc_id)
-            if not tenant_id:
-                return get_data_error_result(retmsg="Tenant not found!")
 
-            b, n = File2DocumentService.get_minio_address(doc_id=doc_id)
+    docs = DocumentService.get_by_ids_with_tenant(doc_ids)
+    addrs = File2DocumentService.get_minio_addresses(doc_ids)
 
-            if not DocumentService.remove_document(doc, tenant_id):
-                return get_data_error_result(
-                    retmsg="Database error (Document removal)!")
+    def _rm_one(doc_id):
+        if doc_id not in docs:
+            raise LookupError("Document not found!")
+        doc, tenant_id = docs[doc_id]
+        b, n = addrs[doc_id]
 
-            f2d = File2DocumentService.get_by_document_id(doc_id)
-            FileService.filter_delete([File.source_type == FileSource.KNOWLEDGEBASE, File.id == f2d[0].file_id])
-            File2DocumentService.delete_by_document_id(doc_id)
+        if not DocumentService.remove_document(doc, tenant_id, refresh=False):
+            raise RuntimeError("Database error (Document removal)!")
+        return doc_id, b, n
 
-            MINIO.rm(b, n)
-        except Exception as e:
-            errors += str(e)
+    errors = ""
+    removed = []
+    bucket_objs = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(_MAX_WORKERS, len(doc_ids)))) as exe:
+        threads = [exe.submit(_rm_one, doc_id) for doc_id in doc_ids]
+        for th in as_completed(threads):
+            try:
+                doc_id, b, n = th.result()
+                removed.append(doc_id)
+                # Virtual documents from /create have no stored object.
+                if n:
+                    bucket_objs.setdefault(b, []).append(n)
+            except Exception as e:
+                errors += str(e)
+
+    if removed:
+        file_ids = File2DocumentService.get_file_ids(removed)
+        if file_ids:
+            FileService.filter_delete([File.source_type == FileSource.KNOWLEDGEBASE, File.id.in_(file_ids)])
+        File2DocumentService.delete_by_document_ids(removed)
+
+    # Chunks were deleted without refreshing; refresh each touched index once.
+    for idxnm in set(search.index_name(tenant_id) for _, tenant_id in docs.values()):
+        ELASTICSEARCH.refreshIdx(idxnm)
+
+    for b, names in bucket_objs.items():
+        errors += "".join(MINIO.rm_many(b, names))
 
     if errors:
         return get_json_result(data=False, retmsg=errors, retcode=RetCode.SERVER_ERROR)
@@ -320,154 +349,172 @@ def rm():
 @manager.route('/run', methods=['POST'])
 @login_required
 @validate_request("doc_ids", "run")
+@handle_errors
 def run():
     req = request.json
-    try:
-        for id in req["doc_ids"]:
-            info = {"run": str(req["run"]), "progress": 0}
-            if str(req["run"]) == TaskStatus.RUNNING.value:
-                info["progress_msg"] = ""
-                info["chunk_num"] = 0
-                info["token_num"] = 0
-            DocumentService.update_by_id(id, info)
-            # if str(req["run"]) == TaskStatus.CANCEL.value:
-            tenant_id = DocumentService.get_tenant_id(id)
-            if not tenant_id:
-                return get_data_error_result(retmsg="Tenant not found!")
-            ELASTICSEARCH.deleteByQuery(
-                Q("match", doc_id=id), idxnm=search.index_name(tenant_id))
-
-            if str(req["run"]) == TaskStatus.RUNNING.value:
-                TaskService.filter_delete([Task.doc_id == id])
-                e, doc = DocumentService.get_by_id(id)
-                doc = doc.to_dict()
-                doc["tenant_id"] = tenant_id
-                bucket, name = File2DocumentService.get_minio_address(doc_id=doc["id"])
-                queue_tasks(doc, bucket, name)
-
-        return get_json_result(data=True)
-    except Exception as e:
-        return server_error_response(e)
+    doc_ids = list(dict.fromkeys(req["doc_ids"]))
+    info = {"run": str(req["run"]), "progress": 0}
+    if str(req["run"]) == TaskStatus.RUNNING.value:
+        info["progress_msg"] = ""
+        info["chunk_num"] = 0
+        info["token_num"] = 0
+    docs = DocumentService.get_by_ids_with_tenant(doc_ids)
+    addrs = File2DocumentService.get_minio_addresses(doc_ids)
+
+    def _reset_one(id):
+        DocumentService.update_by_id(id, dict(info))
+        # if str(req["run"]) == TaskStatus.CANCEL.value:
+        if id not in docs:
+            raise LookupError("Tenant not found!")
+        return id, docs[id][1]
+
+    def _queue_one(id, tenant_id):
+        TaskService.filter_delete([Task.doc_id == id])
+        doc = docs[id][0].to_dict()
+        # The snapshot predates update_by_id in _reset_one; apply the same reset.
+        doc.update(info)
+        doc["tenant_id"] = tenant_id
+        bucket, name = addrs[id]
+        queue_tasks(doc, bucket, name)
+
+    errors = ""
+    tenant_ids = {}
+    idx_doc_ids = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(_MAX_WORKERS, len(doc_ids)))) as exe:
+        for th in as_completed([exe.submit(_reset_one, id) for id in doc_ids]):
+            try:
+                id, tenant_id = th.result()
+            except Exception as e:
+                errors += str(e)
+                continue
+            tenant_ids[id] = tenant_id
+            idx_doc_ids.setdefault(search.index_name(tenant_id), []).append(id)
+
+        # One delete-by-query per index instead of one per document.
+        for idxnm, ids in idx_doc_ids.items():
+            ELASTICSEARCH.deleteByQuery(Q("terms", doc_id=ids), idxnm=idxnm)
+
+        if str(req["run"]) == TaskStatus.RUNNING.value:
+            threads = [exe.submit(_queue_one, id, tenant_id) for id, tenant_id in tenant_ids.items()]
+            for th in as_completed(threads):
+                try:
+                    th.result()
+                except Exception as e:
+                    errors += str(e)
+
+    if errors:
+        return get_json_result(data=False, retmsg=errors, retcode=RetCode.SERVER_ERROR)
+    return get_json_result(data=True)
 
 
 @manager.route('/rename', methods=['POST'])
 @login_required
 @validate_request("doc_id", "name")
+@handle_errors
 def rename():
     req = request.json
-    try:
-        e, doc = DocumentService.get_by_id(req["doc_id"])
-        if not e:
-            return get_data_error_result(retmsg="Document not found!")
-        if pathlib.Path(req["name"].lower()).suffix != pathlib.Path(
-                doc.name.lower()).suffix:
-            return get_json_result(
-                data=False,
-                retmsg="The extension of file can't be changed",
-                retcode=RetCode.ARGUMENT_ERROR)
-        for d in DocumentService.query(name=req["name"], kb_id=doc.kb_id):
-            if d.name == req["name"]:
-                return get_data_error_result(
-                    retmsg="Duplicated document name in the same knowledgebase.")
-
-        if not DocumentService.update_by_id(
-                req["doc_id"], {"name": req["name"]}):
+    e, doc = DocumentService.get_by_id(req["doc_id"])
+    if not e:
+        return get_data_error_result(retmsg="Document not found!")
+    if os.path.splitext(req["name"])[1].lower() != os.path.splitext(doc.name)[1].lower():
+        return get_json_result(
+            data=False,
+            retmsg="The extension of file can't be changed",
+            retcode=RetCode.ARGUMENT_ERROR)
+    for d in DocumentService.query(name=req["name"], kb_id=doc.kb_id):
+        if d.name == req["name"]:
             return get_data_error_result(
-                retmsg="Database error (Document rename)!")
+                retmsg="Duplicated document name in the same knowledgebase.")
 
-        informs = File2DocumentService.get_by_document_id(req["doc_id"])
-        if informs:
-            e, file = FileService.get_by_id(informs[0].file_id)
-            FileService.update_by_id(file.id, {"name": req["name"]})
+    if not DocumentService.update_by_id(
+            req["doc_id"], {"name": req["name"]}):
+        return get_data_error_result(
+            retmsg="Database error (Document rename)!")
 
-        return get_json_result(data=True)
-    except Exception as e:
-        return server_error_response(e)
+    informs = File2DocumentService.get_by_document_id(req["doc_id"])
+    if informs:
+        e, file = FileService.get_by_id(informs[0].file_id)
+        FileService.update_by_id(file.id, {"name": req["name"]})
+
+    return get_json_result(data=True)
 
 
 @manager.route('/get/<doc_id>', methods=['GET'])
 # @login_required
+@handle_errors
 def get(doc_id):
-    try:
-        e, doc = DocumentService.get_by_id(doc_id)
-        if not e:
-            return get_data_error_result(retmsg="Document not found!")
-
-        b, n = File2DocumentService.get_minio_address(doc_id=doc_id)
-        response = flask.make_response(MINIO.get(b, n))
-
-        ext = re.search(r"\.([^.]+)$", doc.name)
-        if ext:
-            if doc.type == FileType.VISUAL.value:
-                response.headers.set('Content-Type', 'image/%s' % ext.group(1))
-            else:
-                response.headers.set(
-                    'Content-Type',
-                    'application/%s' %
-                    ext.group(1))
-        return response
-    except Exception as e:
-        return server_error_response(e)
+    e, doc = DocumentService.get_by_id(doc_id)
+    if not e:
+        return get_data_error_result(retmsg="Document not found!")
+
+    b, n = File2DocumentService.get_minio_address(doc_id=doc_id)
+    obj = MINIO.get_stream(b, n)
+    if obj is None:
+        return get_data_error_result(retmsg="File not found!")
+    response = _stream_response(obj)
+
+    ext = _EXT_SUFFIX.search(doc.name)
+    if ext:
+        if doc.type == FileType.VISUAL.value:
+            response.headers.set('Content-Type', 'image/%s' % ext.group(1))
+        else:
+            response.headers.set(
+                'Content-Type',
+                'application/%s' %
+                ext.group(1))
+    return response
 
 
 @manager.route('/change_parser', methods=['POST'])
 @login_required
 @validate_request("doc_id", "parser_id")
+@handle_errors
 def change_parser():
     req = request.json
-    try:
-        e, doc = DocumentService.get_by_id(req["doc_id"])
-        if not e:
-            return get_data_error_result(retmsg="Document not found!")
-        if doc.parser_id.lower() == req["parser_id"].lower():
-            if "parser_config" in req:
-                if req["parser_config"] == doc.parser_config:
-                    return get_json_result(data=True)
-            else:
+    if req.get("parser_config"):
+        _cast_parser_config(req["parser_config"])
+    doc, tenant_id = DocumentService.get_by_id_with_tenant(req["doc_id"])
+    if not doc:
+        return get_data_error_result(retmsg="Document not found!")
+    if doc.parser_id.lower() == req["parser_id"].lower():
+        if "parser_config" in req:
+            if req["parser_config"] == doc.parser_config:
                 return get_json_result(data=True)
+        else:
+            return get_json_result(data=True)
 
-        if doc.type == FileType.VISUAL or re.search(
-                r"\.(ppt|pptx|pages)$", doc.name):
-            return get_data_error_result(retmsg="Not supported yet!")
+    if doc.type == FileType.VISUAL or _EXT_PRESENTATION.search(doc.name):
+        return get_data_error_result(retmsg="Not supported yet!")
 
-        e = DocumentService.update_by_id(doc.id,
-                                         {"parser_id": req["parser_id"], "progress": 0, "progress_msg": "",
-                                          "run": TaskStatus.UNSTART.value})
+    e = DocumentService.update_parser(doc, req["parser_id"], req.get("parser_config"))
+    if not e:
+        return get_data_error_result(retmsg="Document not found!")
+    if doc.token_num > 0:
+        e = DocumentService.increment_chunk_num(doc.id, doc.kb_id, doc.token_num * -1, doc.chunk_num * -1,
+                                                doc.process_duation * -1)
         if not e:
             return get_data_error_result(retmsg="Document not found!")
-        if "parser_config" in req:
-            DocumentService.update_parser_config(doc.id, req["parser_config"])
-        if doc.token_num > 0:
-            e = DocumentService.increment_chunk_num(doc.id, doc.kb_id, doc.token_num * -1, doc.chunk_num * -1,
-                                                    doc.process_duation * -1)
-            if not e:
-                return get_data_error_result(retmsg="Document not found!")
-            tenant_id = DocumentService.get_tenant_id(req["doc_id"])
-            if not tenant_id:
-                return get_data_error_result(retmsg="Tenant not found!")
-            ELASTICSEARCH.deleteByQuery(
-                Q("match", doc_id=doc.id), idxnm=search.index_name(tenant_id))
-
-        return get_json_result(data=True)
-    except Exception as e:
-        return server_error_response(e)
+        ELASTICSEARCH.deleteByQuery(
+            Q("match", doc_id=doc.id), idxnm=search.index_name(tenant_id))
+
+    return get_json_result(data=True)
 
 
 @manager.route('/image/<image_id>', methods=['GET'])
 # @login_required
+@handle_errors
 def get_image(image_id):
-    try:
-        bkt, nm = image_id.split("-")
-        response = flask.make_response(MINIO.get(bkt, nm))
-        response.headers.set('Content-Type', 'image/JPEG')
-        return response
-    except Exception as e:
-        return server_error_response(e)
+    bkt, nm = image_id.split("-")
+    obj = MINIO.get_stream(bkt, nm)
+    if obj is None:
+        return get_data_error_result(retmsg="Image not found!")
+    return _stream_response(obj, content_type='image/JPEG')
 
 
 @manager.route('/upload_and_parse', methods=['POST'])
 @login_required
 @validate_request("conversation_id")
+@handle_errors
 def upload_and_parse():
     if 'file' not in request.files:
         return get_json_result(
@@ -479,6 +526,6 @@ def upload_and_parse():
             return get_json_result(
                 data=False, retmsg='No file selected!', retcode=RetCode.ARGUMENT_ERROR)
 
-    doc_ids = doc_upload_and_parse(request.form.get("conversation_id"), file_objs, current_user.id)
+    doc_ids = doc_upload_and_queue(request.form.get("conversation_id"), file_objs, current_user.id)
 
     return get_json_result(data=doc_ids)
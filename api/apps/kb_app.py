@@ -21,7 +21,7 @@ from api.db.services import duplicate_name
 from api.db.services.document_service import DocumentService
 from api.db.services.file2document_service import File2DocumentService
 from api.db.services.file_service import FileService
-from api.db.services.user_service import TenantService, UserTenantService
+from api.db.services.user_service import TenantService
 from api.utils.api_utils import server_error_response, get_data_error_result, validate_request
 from api.utils import get_uuid, get_format_time
 from api.db import StatusEnum, UserTenantRole, FileSource
@@ -100,12 +100,7 @@ def update():
 def detail():
     kb_id = request.args["kb_id"]
     try:
-        tenants = UserTenantService.query(user_id=current_user.id)
-        for tenant in tenants:
-            if KnowledgebaseService.query(
-                    tenant_id=tenant.tenant_id, id=kb_id):
-                break
-        else:
+        if not KnowledgebaseService.user_has_access(current_user.id, kb_id):
             return get_json_result(
                 data=False, retmsg=f'Only owner of knowledgebase authorized for this operation.',
                 retcode=RetCode.OPERATING_ERROR)
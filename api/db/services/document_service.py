@@ -20,7 +20,6 @@ import random
 import re
 import traceback
 from concurrent.futures import ThreadPoolExecutor
-from copy import deepcopy
 from datetime import datetime
 from io import BytesIO
 
@@ -29,7 +28,7 @@ from peewee import fn
 
 from api.db.db_utils import bulk_insert_into_db
 from api.settings import stat_logger
-from api.utils import current_timestamp, get_format_time, get_uuid
+from api.utils import current_timestamp, datetime_format, get_format_time, get_uuid
 from api.utils.file_utils import get_project_base_directory
 from graphrag.mind_map_extractor import MindMapExtractor
 from rag.settings import SVR_QUEUE_NAME
@@ -60,15 +59,20 @@ class DocumentService(CommonService):
             )
         else:
             docs = cls.model.select().where(cls.model.kb_id == kb_id)
-        count = docs.count()
         if desc:
-            docs = docs.order_by(cls.model.getter_by(orderby).desc())
+            query = docs.order_by(cls.model.getter_by(orderby).desc())
         else:
-            docs = docs.order_by(cls.model.getter_by(orderby).asc())
+            query = docs.order_by(cls.model.getter_by(orderby).asc())
 
-        docs = docs.paginate(page_number, items_per_page)
+        page = list(query.paginate(page_number, items_per_page).dicts())
+        # A short page is the last one, so the total can be derived from it
+        # without a separate COUNT(*) round-trip.
+        if items_per_page > 0 and (0 < len(page) < items_per_page or (not page and page_number <= 1)):
+            count = (max(page_number, 1) - 1) * items_per_page + len(page)
+        else:
+            count = docs.count()
 
-        return list(docs.dicts()), count
+        return page, count
 
     @classmethod
     @DB.connection_context()
@@ -115,9 +119,26 @@ class DocumentService(CommonService):
 
     @classmethod
     @DB.connection_context()
-    def remove_document(cls, doc, tenant_id):
+    def insert_many(cls, docs, batch_size=100):
+        if not docs:
+            return
+        kb_doc_nums = {}
+        for d in docs:
+            d["update_time"] = current_timestamp()
+            d["update_date"] = datetime_format(datetime.now())
+            kb_doc_nums[d["kb_id"]] = kb_doc_nums.get(d["kb_id"], 0) + 1
+        with DB.atomic():
+            super().insert_many(docs, batch_size)
+            for kb_id, num in kb_doc_nums.items():
+                if not Knowledgebase.update(doc_num=Knowledgebase.doc_num + num).where(
+                        Knowledgebase.id == kb_id).execute():
+                    raise RuntimeError("Database error (Knowledgebase)!")
+
+    @classmethod
+    @DB.connection_context()
+    def remove_document(cls, doc, tenant_id, refresh=True):
         ELASTICSEARCH.deleteByQuery(
-                Q("match", doc_id=doc.id), idxnm=search.index_name(tenant_id))
+                Q("match", doc_id=doc.id), idxnm=search.index_name(tenant_id), refresh=refresh)
         cls.clear_chunk_num(doc.id)
         return cls.delete_by_id(doc.id)
 
@@ -228,6 +249,21 @@ class DocumentService(CommonService):
             return
         return docs[0]["tenant_id"]
 
+    @classmethod
+    @DB.connection_context()
+    def get_by_ids_with_tenant(cls, doc_ids):
+        docs = cls.model.select(
+            cls.model, Knowledgebase.tenant_id).join(
+            Knowledgebase, on=(
+                Knowledgebase.id == cls.model.kb_id)).where(
+                cls.model.id.in_(doc_ids), Knowledgebase.status == StatusEnum.VALID.value)
+        return {d.id: (d, d.tenant_id) for d in docs.objects()}
+
+    @classmethod
+    @DB.connection_context()
+    def get_by_id_with_tenant(cls, doc_id):
+        return cls.get_by_ids_with_tenant([doc_id]).get(doc_id, (None, None))
+
     @classmethod
     @DB.connection_context()
     def get_tenant_id_by_name(cls, name):
@@ -267,10 +303,13 @@ class DocumentService(CommonService):
 
     @classmethod
     @DB.connection_context()
-    def get_thumbnails(cls, docids):
+    def get_thumbnails(cls, docids, batch_size=1000):
         fields = [cls.model.id, cls.model.thumbnail]
-        return list(cls.model.select(
-            *fields).where(cls.model.id.in_(docids)).dicts())
+        thumbnails = []
+        for i in range(0, len(docids), batch_size):
+            thumbnails.extend(cls.model.select(*fields).where(
+                cls.model.id.in_(docids[i:i + batch_size])).dicts().iterator())
+        return thumbnails
 
     @classmethod
     @DB.connection_context()
@@ -278,20 +317,19 @@ class DocumentService(CommonService):
         e, d = cls.get_by_id(id)
         if not e:
             raise LookupError(f"Document({id}) not found.")
-
-        def dfs_update(old, new):
-            for k, v in new.items():
-                if k not in old:
-                    old[k] = v
-                    continue
-                if isinstance(v, dict):
-                    assert isinstance(old[k], dict)
-                    dfs_update(old[k], v)
-                else:
-                    old[k] = v
         dfs_update(d.parser_config, config)
         cls.update_by_id(id, {"parser_config": d.parser_config})
 
+    @classmethod
+    @DB.connection_context()
+    def update_parser(cls, doc, parser_id, parser_config=None):
+        info = {"parser_id": parser_id, "progress": 0, "progress_msg": "",
+                "run": TaskStatus.UNSTART.value}
+        if parser_config is not None:
+            dfs_update(doc.parser_config, parser_config)
+            info["parser_config"] = doc.parser_config
+        return cls.update_by_id(doc.id, info)
+
     @classmethod
     @DB.connection_context()
     def get_doc_count(cls, tenant_id):
@@ -376,6 +414,18 @@ class DocumentService(CommonService):
         return False
 
 
+def dfs_update(old, new):
+    for k, v in new.items():
+        if k not in old:
+            old[k] = v
+            continue
+        if isinstance(v, dict):
+            assert isinstance(old[k], dict)
+            dfs_update(old[k], v)
+        else:
+            old[k] = v
+
+
 def queue_raptor_tasks(doc):
     def new_task():
         nonlocal doc
@@ -393,12 +443,15 @@ def queue_raptor_tasks(doc):
     assert REDIS_CONN.queue_product(SVR_QUEUE_NAME, message=task), "Can't access Redis. Please check the Redis' status."
 
 
-def doc_upload_and_parse(conversation_id, file_objs, user_id):
-    from rag.app import presentation, picture, naive, audio, email
+# Parsers and config used for files uploaded straight into a conversation;
+# any other parser falls back to naive.
+_CONVERSATION_PARSER_IDS = (ParserType.PRESENTATION.value, ParserType.PICTURE.value,
+                            ParserType.AUDIO.value, ParserType.EMAIL.value)
+_CONVERSATION_PARSER_CONFIG = {"chunk_token_num": 4096, "delimiter": "\n!?;。；！？", "layout_recognize": False}
+
+
+def get_conversation_kb(conversation_id):
     from api.db.services.dialog_service import ConversationService, DialogService
-    from api.db.services.file_service import FileService
-    from api.db.services.llm_service import LLMBundle
-    from api.db.services.user_service import TenantService
     from api.db.services.api_service import API4ConversationService
 
     e, conv = ConversationService.get_by_id(conversation_id)
@@ -411,6 +464,16 @@ def doc_upload_and_parse(conversation_id, file_objs, user_id):
     e, kb = KnowledgebaseService.get_by_id(kb_id)
     if not e:
         raise LookupError("Can't find this knowledgebase!")
+    return kb
+
+
+def doc_upload_and_parse(conversation_id, file_objs, user_id):
+    from rag.app import presentation, picture, naive, audio, email
+    from api.db.services.file_service import FileService
+    from api.db.services.llm_service import LLMBundle
+    from api.db.services.user_service import TenantService
+
+    kb = get_conversation_kb(conversation_id)
 
     idxnm = search.index_name(kb.tenant_id)
     if not ELASTICSEARCH.indexExist(idxnm):
@@ -421,6 +484,9 @@ def doc_upload_and_parse(conversation_id, file_objs, user_id):
 
     err, files = FileService.upload_document(kb, file_objs, user_id)
     assert not err, "\n".join(err)
+    for i, (d, stream) in enumerate(files):
+        stream.seek(0)
+        files[i] = (d, stream.read())
 
     def dummy(prog=None, msg=""):
         pass
@@ -431,7 +497,7 @@ def doc_upload_and_parse(conversation_id, file_objs, user_id):
         ParserType.AUDIO.value: audio,
         ParserType.EMAIL.value: email
     }
-    parser_config = {"chunk_token_num": 4096, "delimiter": "\n!?;。；！？", "layout_recognize": False}
+    parser_config = dict(_CONVERSATION_PARSER_CONFIG)
     exe = ThreadPoolExecutor(max_workers=12)
     threads = []
     doc_nm = {}
@@ -450,12 +516,11 @@ def doc_upload_and_parse(conversation_id, file_objs, user_id):
 
     for (docinfo, _), th in zip(files, threads):
         docs = []
-        doc = {
-            "doc_id": docinfo["id"],
-            "kb_id": [kb.id]
-        }
         for ck in th.result():
-            d = deepcopy(doc)
+            d = {
+                "doc_id": docinfo["id"],
+                "kb_id": [kb.id]
+            }
             d.update(ck)
             md5 = hashlib.md5()
             md5.update((ck["content_with_weight"] +
@@ -529,4 +594,33 @@ def doc_upload_and_parse(conversation_id, file_objs, user_id):
         DocumentService.increment_chunk_num(
             doc_id, kb.id, token_counts[doc_id], chunk_counts[doc_id], 0)
 
-    return [d["id"] for d,_ in files]
\ No newline at end of file
+    return [d["id"] for d,_ in files]
+
+
+def doc_upload_and_queue(conversation_id, file_objs, user_id):
+    from api.db.services.file_service import FileService
+    from api.db.services.task_service import queue_tasks
+
+    kb = get_conversation_kb(conversation_id)
+
+    err, files = FileService.upload_document(kb, file_objs, user_id)
+    assert not err, "\n".join(err)
+
+    docids = [d["id"] for d, _ in files]
+    by_parser = {}
+    for d, _ in files:
+        if d["parser_id"] not in _CONVERSATION_PARSER_IDS:
+            d["parser_id"] = ParserType.NAIVE.value
+        d["parser_config"] = dict(_CONVERSATION_PARSER_CONFIG)
+        d["run"] = TaskStatus.RUNNING.value
+        d["tenant_id"] = kb.tenant_id
+        by_parser.setdefault(d["parser_id"], []).append(d["id"])
+    for parser_id, ids in by_parser.items():
+        DocumentService.filter_update([Document.id.in_(ids)],
+                                      {"parser_id": parser_id,
+                                       "parser_config": _CONVERSATION_PARSER_CONFIG,
+                                       "run": TaskStatus.RUNNING.value})
+    for d, _ in files:
+        queue_tasks(d, kb.id, d["location"])
+
+    return docids
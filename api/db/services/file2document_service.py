@@ -15,9 +15,11 @@
 #
 from datetime import datetime
 
+from peewee import JOIN
+
 from api.db import FileSource
 from api.db.db_models import DB
-from api.db.db_models import File, File2Document
+from api.db.db_models import File, File2Document, Document
 from api.db.services.common_service import CommonService
 from api.db.services.document_service import DocumentService
 from api.utils import current_timestamp, datetime_format, get_uuid
@@ -58,6 +60,17 @@ class File2DocumentService(CommonService):
     def delete_by_document_id(cls, doc_id):
         return cls.model.delete().where(cls.model.document_id == doc_id).execute()
 
+    @classmethod
+    @DB.connection_context()
+    def delete_by_document_ids(cls, doc_ids):
+        return cls.model.delete().where(cls.model.document_id.in_(doc_ids)).execute()
+
+    @classmethod
+    @DB.connection_context()
+    def get_file_ids(cls, doc_ids):
+        objs = cls.model.select(cls.model.file_id).where(cls.model.document_id.in_(doc_ids))
+        return [o.file_id for o in objs]
+
     @classmethod
     @DB.connection_context()
     def update_by_file_id(cls, file_id, obj):
@@ -83,3 +96,22 @@ class File2DocumentService(CommonService):
         assert doc_id, "please specify doc_id"
         e, doc = DocumentService.get_by_id(doc_id)
         return doc.kb_id, doc.location
+
+    @classmethod
+    @DB.connection_context()
+    def get_minio_addresses(cls, doc_ids):
+        fields = [Document.id, Document.kb_id, Document.location, File.parent_id,
+                  File.location.alias("file_location"), File.source_type]
+        docs = Document.select(*fields) \
+            .join(cls.model, JOIN.LEFT_OUTER, on=(cls.model.document_id == Document.id)) \
+            .join(File, JOIN.LEFT_OUTER, on=(File.id == cls.model.file_id)) \
+            .where(Document.id.in_(doc_ids))
+        addrs = {}
+        for d in docs.dicts():
+            if d["id"] in addrs:
+                continue
+            if d["source_type"] == FileSource.LOCAL:
+                addrs[d["id"]] = (d["parent_id"], d["file_location"])
+            else:
+                addrs[d["id"]] = (d["kb_id"], d["location"])
+        return addrs
@@ -15,6 +15,7 @@
 #
 import re
 import os
+from concurrent.futures import ThreadPoolExecutor
 from flask_login import current_user
 from peewee import fn
 
@@ -334,51 +335,79 @@ class FileService(CommonService):
         kb_root_folder = self.get_kb_folder(user_id)
         kb_folder = self.new_a_file_from_kb(kb.tenant_id, kb.name, kb_root_folder["id"])
 
+        def name_exists(**kwargs):
+            return kwargs["name"] in batch_names or DocumentService.query(**kwargs)
+
+        def store(file, filename, filetype):
+            location = filename
+            while MINIO.obj_exist(kb.id, location):
+                location += "_"
+            blob = file.stream
+            blob.seek(0, os.SEEK_END)
+            size = blob.tell()
+            MINIO.put(kb.id, location, blob, size)
+            doc = {
+                "id": get_uuid(),
+                "kb_id": kb.id,
+                "parser_id": kb.parser_id,
+                "parser_config": kb.parser_config,
+                "created_by": user_id,
+                "type": filetype,
+                "name": filename,
+                "location": location,
+                "size": size,
+                "thumbnail": thumbnail(filename, blob)
+            }
+            if doc["type"] == FileType.VISUAL:
+                doc["parser_id"] = ParserType.PICTURE.value
+            if doc["type"] == FileType.AURAL:
+                doc["parser_id"] = ParserType.AUDIO.value
+            if re.search(r"\.(ppt|pptx|pages)$", filename):
+                doc["parser_id"] = ParserType.PRESENTATION.value
+            if re.search(r"\.(eml)$", filename):
+                doc["parser_id"] = ParserType.EMAIL.value
+            return doc, blob
+
         err, files = [], []
-        for file in file_objs:
-            try:
-                MAX_FILE_NUM_PER_USER = int(os.environ.get('MAX_FILE_NUM_PER_USER', 0))
-                if MAX_FILE_NUM_PER_USER > 0 and DocumentService.get_doc_count(kb.tenant_id) >= MAX_FILE_NUM_PER_USER:
-                    raise RuntimeError("Exceed the maximum file number of a free user!")
-
-                filename = duplicate_name(
-                    DocumentService.query,
-                    name=file.filename,
-                    kb_id=kb.id)
-                filetype = filename_type(filename)
-                if filetype == FileType.OTHER.value:
-                    raise RuntimeError("This type of file has not been supported yet!")
-
-                location = filename
-                while MINIO.obj_exist(kb.id, location):
-                    location += "_"
-                blob = file.read()
-                MINIO.put(kb.id, location, blob)
-                doc = {
-                    "id": get_uuid(),
-                    "kb_id": kb.id,
-                    "parser_id": kb.parser_id,
-                    "parser_config": kb.parser_config,
-                    "created_by": user_id,
-                    "type": filetype,
-                    "name": filename,
-                    "location": location,
-                    "size": len(blob),
-                    "thumbnail": thumbnail(filename, blob)
-                }
-                if doc["type"] == FileType.VISUAL:
-                    doc["parser_id"] = ParserType.PICTURE.value
-                if doc["type"] == FileType.AURAL:
-                    doc["parser_id"] = ParserType.AUDIO.value
-                if re.search(r"\.(ppt|pptx|pages)$", filename):
-                    doc["parser_id"] = ParserType.PRESENTATION.value
-                if re.search(r"\.(eml)$", filename):
-                    doc["parser_id"] = ParserType.EMAIL.value
-                DocumentService.insert(doc)
-
-                FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
-                files.append((doc, blob))
-            except Exception as e:
-                err.append(file.filename + ": " + str(e))
+        batch_names = set()
+        MAX_FILE_NUM_PER_USER = int(os.environ.get('MAX_FILE_NUM_PER_USER', 0))
+        with ThreadPoolExecutor(max_workers=8) as exe:
+            # Names are resolved one by one so that files of the same batch don't collide,
+            # then the uploads to MinIO run concurrently.
+            threads = []
+            for file in file_objs:
+                try:
+                    if MAX_FILE_NUM_PER_USER > 0 and \
+                            DocumentService.get_doc_count(kb.tenant_id) + len(threads) >= MAX_FILE_NUM_PER_USER:
+                        raise RuntimeError("Exceed the maximum file number of a free user!")
+
+                    filename = duplicate_name(
+                        name_exists,
+                        name=file.filename,
+                        kb_id=kb.id)
+                    filetype = filename_type(filename)
+                    if filetype == FileType.OTHER.value:
+                        raise RuntimeError("This type of file has not been supported yet!")
+                    batch_names.add(filename)
+                    threads.append((file, exe.submit(store, file, filename, filetype)))
+                except Exception as e:
+                    err.append(file.filename + ": " + str(e))
+
+            for file, th in threads:
+                try:
+                    files.append(th.result())
+                except Exception as e:
+                    err.append(file.filename + ": " + str(e))
+
+        try:
+            DocumentService.insert_many([doc for doc, _ in files])
+        except Exception as e:
+            err.extend(doc["name"] + ": " + str(e) for doc, _ in files)
+            # No rows reference the uploaded blobs, so don't leave them behind.
+            err.extend(MINIO.rm_many(kb.id, [doc["location"] for doc, _ in files]))
+            return err, []
+
+        for doc, _ in files:
+            FileService.add_file_from_kb(doc, kb_folder["id"], kb.tenant_id)
 
         return err, files
\ No newline at end of file
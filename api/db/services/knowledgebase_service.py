@@ -14,7 +14,7 @@
 #  limitations under the License.
 #
 from api.db import StatusEnum, TenantPermission
-from api.db.db_models import Knowledgebase, DB, Tenant
+from api.db.db_models import Knowledgebase, DB, Tenant, UserTenant
 from api.db.services.common_service import CommonService
 
 
@@ -65,6 +65,14 @@ class KnowledgebaseService(CommonService):
 
         return kbs[offset:offset+count]
 
+    @classmethod
+    @DB.connection_context()
+    def user_has_access(cls, user_id, kb_id):
+        kbs = cls.model.select(cls.model.id).join(
+            UserTenant, on=(UserTenant.tenant_id == cls.model.tenant_id)).where(
+            UserTenant.user_id == user_id, cls.model.id == kb_id)
+        return kbs.exists()
+
     @classmethod
     @DB.connection_context()
     def get_detail(cls, kb_id):
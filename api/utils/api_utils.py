@@ -162,6 +162,22 @@ def error_response(response_code, retmsg=None):
     }), status=response_code, mimetype='application/json')
 
 
+def handle_errors(func):
+    @wraps(func)
+    def decorated_function(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except KeyError as e:
+            return server_error_response(e)
+        except (LookupError, ValueError) as e:
+            stat_logger.warning("%s: %s", func.__name__, e)
+            return get_data_error_result(retmsg=str(e))
+        except Exception as e:
+            return server_error_response(e)
+
+    return decorated_function
+
+
 def validate_request(*args, **kwargs):
     def wrapper(func):
         @wraps(func)
@@ -171,15 +171,20 @@ def filename_type(filename):
 
 def thumbnail(filename, blob):
     filename = filename.lower()
+    if hasattr(blob, "read"):
+        blob.seek(0)
+        fp = blob
+    else:
+        fp = BytesIO(blob)
     if re.match(r".*\.pdf$", filename):
-        pdf = pdfplumber.open(BytesIO(blob))
+        pdf = pdfplumber.open(fp)
         buffered = BytesIO()
         pdf.pages[0].to_image(resolution=32).annotated.save(buffered, format="png")
         return "data:image/png;base64," + \
             base64.b64encode(buffered.getvalue()).decode("utf-8")
 
     if re.match(r".*\.(jpg|jpeg|png|tif|gif|icon|ico|webp)$", filename):
-        image = Image.open(BytesIO(blob))
+        image = Image.open(fp)
         image.thumbnail((30, 30))
         buffered = BytesIO()
         image.save(buffered, format="png")
@@ -190,7 +195,7 @@ def thumbnail(filename, blob):
         import aspose.slides as slides
         import aspose.pydrawing as drawing
         try:
-            with slides.Presentation(BytesIO(blob)) as presentation:
+            with slides.Presentation(fp if isinstance(fp, BytesIO) else BytesIO(fp.read())) as presentation:
                 buffered = BytesIO()
                 presentation.slides[0].get_thumbnail(0.03, 0.03).save(
                     buffered, drawing.imaging.ImageFormat.png)
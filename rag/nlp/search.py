@@ -17,6 +17,7 @@
 import json
 import re
 from copy import deepcopy
+from functools import lru_cache
 
 from elasticsearch_dsl import Q, Search
 from typing import List, Optional, Dict, Union
@@ -28,6 +29,7 @@ from rag.nlp import rag_tokenizer, query
 import numpy as np
 
 
+@lru_cache(maxsize=4096)
 def index_name(uid): return f"ragflow_{uid}"
 
 
@@ -303,11 +303,14 @@ class ESConnection:
 
         return False
 
-    def updateScriptByQuery(self, q, scripts, idxnm=None):
+    def updateScriptByQuery(self, q, scripts, idxnm=None, params=None):
         ubq = UpdateByQuery(
             index=self.idxnm if not idxnm else idxnm).using(
             self.es).query(q)
-        ubq = ubq.script(source=scripts)
+        if params:
+            ubq = ubq.script(source=scripts, params=params)
+        else:
+            ubq = ubq.script(source=scripts)
         ubq = ubq.params(refresh=True)
         ubq = ubq.params(slices=5)
         ubq = ubq.params(conflicts="proceed")
@@ -324,12 +327,12 @@ class ESConnection:
 
         return False
 
-    def deleteByQuery(self, query, idxnm=""):
+    def deleteByQuery(self, query, idxnm="", refresh=True):
         for i in range(3):
             try:
                 r = self.es.delete_by_query(
                     index=idxnm if idxnm else self.idxnm,
-                    refresh = True,
+                    refresh=refresh,
                 body=Search().query(query).to_dict())
                 return True
             except Exception as e:
@@ -379,6 +382,19 @@ class ESConnection:
 
         return False
 
+    def refreshIdx(self, idxnm=None):
+        for i in range(3):
+            try:
+                self.es.indices.refresh(index=idxnm if idxnm else self.idxnm)
+                return True
+            except Exception as e:
+                es_logger.error("ES refresh index: " + str(e))
+                if str(e).find("NotFoundError") > 0: return True
+                if str(e).find("Timeout") > 0:
+                    continue
+
+        return False
+
     def docExist(self, docid, idxnm=None):
         for i in range(3):
             try:
@@ -1,6 +1,7 @@
 import os
 import time
 from minio import Minio
+from minio.deleteobjects import DeleteObject
 from io import BytesIO
 from rag import settings
 from rag.settings import minio_logger
@@ -44,15 +45,24 @@ class RAGFlowMinio(object):
                                  )
         return r
 
-    def put(self, bucket, fnm, binary):
+    def put(self, bucket, fnm, binary, length=None):
         for _ in range(3):
             try:
                 if not self.conn.bucket_exists(bucket):
                     self.conn.make_bucket(bucket)
 
-                r = self.conn.put_object(bucket, fnm,
-                                         BytesIO(binary),
-                                         len(binary)
+                if isinstance(binary, (bytes, bytearray)):
+                    r = self.conn.put_object(bucket, fnm,
+                                             BytesIO(binary),
+                                             len(binary)
+                                             )
+                    return r
+
+                # File-like objects are streamed as is, without being read into memory first.
+                binary.seek(0)
+                r = self.conn.put_object(bucket, fnm, binary,
+                                         length if length is not None else -1,
+                                         part_size=10 * 1024 * 1024
                                          )
                 return r
             except Exception as e:
@@ -66,6 +76,24 @@ class RAGFlowMinio(object):
         except Exception as e:
             minio_logger.error(f"Fail rm {bucket}/{fnm}: " + str(e))
 
+    def rm_many(self, bucket, fnms):
+        errors = []
+        fnms = [fnm for fnm in fnms if fnm]
+        if not fnms:
+            return errors
+        try:
+            for err in self.conn.remove_objects(bucket, [DeleteObject(fnm) for fnm in fnms]):
+                minio_logger.error(f"Fail rm {bucket}/{err.name}: " + str(err.message))
+                if err.code == "NoSuchBucket":
+                    continue
+                errors.append(f"{bucket}/{err.name}: {err.message}")
+        except Exception as e:
+            minio_logger.error(f"Fail rm {bucket}: " + str(e))
+            # Nothing to remove from a bucket that was never created; same as rm().
+            if getattr(e, "code", None) != "NoSuchBucket":
+                errors.append(f"{bucket}: {e}")
+        return errors
+
     def get(self, bucket, fnm):
         for _ in range(1):
             try:
@@ -77,6 +105,14 @@ class RAGFlowMinio(object):
                 time.sleep(1)
         return
 
+    def get_stream(self, bucket, fnm):
+        # The caller reads the returned response and must close() and
+        # release_conn() it once done.
+        try:
+            return self.conn.get_object(bucket, fnm)
+        except Exception as e:
+            minio_logger.error(f"fail get {bucket}/{fnm}: " + str(e))
+
     def obj_exist(self, bucket, fnm):
         try:
             if self.conn.stat_object(bucket, fnm):return True